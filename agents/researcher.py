@@ -2,7 +2,7 @@ import os
 import random
 from datetime import datetime
 from enum import Enum
-from typing import Callable
+from typing import AsyncIterator, Callable
 
 from chromadb import ClientAPI
 from langchain.schema import Document
@@ -16,7 +16,12 @@ from agents.researcher_data import Report, ResearchReportData
 from agents.websearcher_quick import get_websearcher_response_quick
 from components.chroma_ddg import exists_collection
 from components.llm import get_prompt_llm_chain
-from utils.async_utils import gather_tasks_sync, make_sync
+from utils.async_utils import (
+    gather_with_concurrency,
+    make_sync,
+    run_in_daemon_thread,
+    run_task_sync,
+)
 from utils.chat_state import ChatState
 from utils.docgrab import ingest_docs_into_chroma
 from utils.helpers import (
@@ -175,6 +180,16 @@ MAX_QUERY_GENERATOR_ATTEMPTS = 5
 DEFAULT_MAX_TOKENS_FINAL_CONTEXT = int(CONTEXT_LENGTH * 0.7)
 NUM_OK_LINKS_NEW_REPORT = min(7, round(DEFAULT_MAX_TOKENS_FINAL_CONTEXT / 1600))
 # TODO: experiment with reducing the number of sources (gpt-3.5 may have trouble with 7)
+MAX_CONCURRENT_SEARCHES = 8  # to stay within the search API's rate limits
+
+
+async def aget_search_results(queries: list[str], num_search_results: int) -> list:
+    """
+    Do a Google search for each query, with the searches running concurrently.
+    """
+    search = GoogleSerperAPIWrapper(k=num_search_results)
+    search_coros = [search.aresults(query) for query in queries]
+    return await gather_with_concurrency(MAX_CONCURRENT_SEARCHES, search_coros)
 
 
 def get_initial_researcher_response(
@@ -226,9 +241,9 @@ def get_initial_researcher_response(
         num_search_results = (
             100 if chat_state.chat_mode == ChatMode.RESEARCH_COMMAND_ID else 10
         )  # default is 10; 20-100 costs 2 credits per query
-        search = GoogleSerperAPIWrapper(k=num_search_results)
-        search_tasks = [search.aresults(query) for query in queries]
-        search_results = gather_tasks_sync(search_tasks)  # TODO serper has batching
+        search_results = run_task_sync(
+            aget_search_results(queries, num_search_results)
+        )  # TODO serper has batching
 
         # Get links from search results
         all_links = get_links(search_results)
@@ -977,6 +992,27 @@ def get_researcher_response(chat_state: ChatState) -> Props:
     )  # contains parsed query for next iteration, if any
 
 
+async def aget_researcher_response(chat_state: ChatState) -> AsyncIterator[Props]:
+    """
+    Async version of get_researcher_response that also runs any follow-up research
+    iterations (e.g. for "/research auto 5"), yielding the response for each
+    iteration as soon as it's ready.
+
+    The researcher runs in a (daemon) worker thread, so that the caller's event loop stays
+    free while the web searches for the generated sub-queries are fanned out
+    concurrently (see aget_search_results). Before requesting the next response,
+    the caller must update chat_state.vectorstore if the research was saved to
+    a new collection.
+    """
+    while True:
+        response = await run_in_daemon_thread(get_researcher_response, chat_state)
+        yield response
+
+        if not (new_parsed_query := response.get("new_parsed_query")):
+            return
+        chat_state.update(parsed_query=new_parsed_query)
+
+
 ########### Snippet for contextual compression ############
 
 # if False:  # skip contextual compression (loses info, at least with GPT-3.5)
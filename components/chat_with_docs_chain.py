@@ -15,7 +15,11 @@ from langchain.schema import BaseRetriever, Document
 from langchain.schema.language_model import BaseLanguageModel
 from langchain.schema.messages import BaseMessage
 
-from components.llm import get_llm_from_prompt_llm_chain
+from components.llm import (
+    get_llm_from_prompt_llm_chain,
+    get_prompt_cache_key,
+    with_prompt_cache_key,
+)
 from utils import lang_utils
 from utils.helpers import DELIMITER
 from utils.prepare import CONTEXT_LENGTH
@@ -175,6 +179,9 @@ class ChatWithDocsChain(Chain):
         # Generate a standalone query using chat history
         if not chat_history:
             standalone_query = user_query  # no chat history to rephrase
+            if query_embedding := inputs.get("query_embedding"):
+                # No need to embed the query again if it was already done
+                search_kwargs = search_kwargs | {"query_embedding": query_embedding}
         else:
             chat_history_for_rephrasing, _ = lang_utils.limit_chat_history(
                 chat_history,
@@ -250,8 +257,14 @@ class ChatWithDocsChain(Chain):
         print(context)
         print(DELIMITER)
 
-        # Submit limited docs and chat history to the chat/qa chain
-        answer = self.qa_from_docs_chain.invoke(qa_inputs, {"callbacks": callbacks})
+        # Submit limited docs and chat history to the chat/qa chain. The docs come
+        # first in the prompt, so follow-ups retrieving the same docs share a prefix,
+        # which the LLM provider can serve from its prompt cache
+        qa_from_docs_chain = self.qa_from_docs_chain
+        if context:
+            cache_key = get_prompt_cache_key(qa_from_docs_chain.first, context)
+            qa_from_docs_chain = with_prompt_cache_key(qa_from_docs_chain, cache_key)
+        answer = qa_from_docs_chain.invoke(qa_inputs, {"callbacks": callbacks})
 
         # Format and return the answer
         output = {self.output_key: answer}
@@ -8,7 +8,7 @@ from langchain.schema import Document
 from langchain.vectorstores.chroma import Chroma
 from langchain_community.vectorstores.chroma import _results_to_docs_and_scores
 
-from components.openai_embeddings_ddg import get_openai_embeddings
+from components.openai_embeddings_ddg import get_batching_openai_embeddings
 from utils.prepare import (
     CHROMA_SERVER_AUTH_CREDENTIALS,
     CHROMA_SERVER_HOST,
@@ -63,6 +63,7 @@ class ChromaDDG(Chroma):
         query: str,
         k: int,  # = DEFAULT_K,
         filter: Where | None = None,
+        query_embedding: list[float] | None = None,
         **kwargs: Any,
     ) -> list[tuple[Document, float]]:
         """
@@ -73,6 +74,8 @@ class ChromaDDG(Chroma):
             k (int): Number of results to return.
             filter (Where | None): Filter by metadata. Corresponds to the chromadb 'where'
                 parameter. Defaults to None.
+            query_embedding (list[float] | None): Embedding of the query text, if
+                already computed. Defaults to None.
             **kwargs: Additional keyword arguments. Only 'where_document' is used, if present.
 
         Returns:
@@ -96,7 +99,8 @@ class ChromaDDG(Chroma):
                 **possible_where_document_kwarg,
             )
         else:
-            query_embedding = self._embedding_function.embed_query(query)
+            if query_embedding is None:
+                query_embedding = self._embedding_function.embed_query(query)
             results = self._Chroma__query_collection(
                 query_embeddings=[query_embedding],
                 n_results=k,
@@ -163,6 +167,6 @@ def load_vectorstore(
     vectorstore = ChromaDDG(
         client=ensure_chroma_client(client),
         collection_name=collection_name,
-        embedding_function=get_openai_embeddings(openai_api_key),
+        embedding_function=get_batching_openai_embeddings(openai_api_key),
     )
     return vectorstore
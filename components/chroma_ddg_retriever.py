@@ -78,7 +78,9 @@ class ChromaDDGRetriever(VectorStoreRetriever):
 
         # Main search method used by DocDocGo
         assert self.search_type == "similarity_ddg", "Invalid search type"
-        assert str(type(self.vectorstore)).endswith("ChromaDDG'>"), "Bad vectorstore"
+        # NOTE: compare by name, since ChromaDDG can get imported twice (when Streamlit
+        # reloads the code), in which case isinstance() would fail
+        assert type(self.vectorstore).__name__ == "ChromaDDG", "Bad vectorstore"
 
         # First, get more docs than we need, then we'll pare them down
         # NOTE this is because apparently Chroma can miss even the most relevant doc
@@ -140,11 +142,13 @@ class ChromaDDGRetriever(VectorStoreRetriever):
                 )
             print(DELIMITER)
 
-        # Get the parent documents for the chunks
-        try:
+        if self.verbose:
             print("METADATAS:")
             for chunk in chunks:
                 print(chunk.metadata)
+
+        # Get the parent documents for the chunks
+        try:
             parent_ids = [chunk.metadata["parent_id"] for chunk in chunks]
         except KeyError:
             # If it's an older collection, without parent docs, just return the chunks
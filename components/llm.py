@@ -1,3 +1,9 @@
+import hashlib
+import operator
+import queue
+import sys
+from functools import reduce
+from threading import Lock, Thread
 from typing import Any
 from uuid import UUID
 
@@ -12,6 +18,7 @@ from langchain.schema import StrOutputParser
 from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
 from streamlit.delta_generator import DeltaGenerator
 
+from components.openai_client import get_openai_client
 from utils.helpers import DELIMITER, MAIN_BOT_PREFIX
 from utils.lang_utils import msg_list_chat_history_to_string
 from utils.prepare import (
@@ -56,6 +63,47 @@ class CallbackHandlerDDGStreamlit(BaseCallbackHandler):
             self.container.markdown(fix_markdown(self.buffer + self.end_str))
 
 
+class StdoutWriter:
+    """
+    Writes text to stdout from a dedicated daemon thread, so that the thread
+    consuming a token stream from the LLM never blocks on the write.
+    """
+
+    def __init__(self, max_queue_size: int = 1024):
+        self.queue: queue.Queue[str] = queue.Queue(maxsize=max_queue_size)
+        self.thread: Thread | None = None
+        self.lock = Lock()
+
+    def _write_from_queue(self) -> None:
+        while True:
+            text = self.queue.get()
+            try:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            except Exception:
+                # E.g. UnicodeEncodeError on a non-UTF-8 console or BrokenPipeError
+                # if piped; skip the text rather than stall everyone who waits on us
+                pass
+            finally:
+                self.queue.task_done()
+
+    def write(self, text: str) -> None:
+        """Schedule the text to be written (blocks only if the queue is full)."""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = Thread(target=self._write_from_queue, daemon=True)
+                    self.thread.start()
+        self.queue.put(text)
+
+    def wait(self) -> None:
+        """Wait until all scheduled text has been written."""
+        self.queue.join()
+
+
+stdout_writer = StdoutWriter()
+
+
 class CallbackHandlerDDGConsole(BaseCallbackHandler):
     def __init__(self, init_str: str = MAIN_BOT_PREFIX):
         self.init_str = init_str
@@ -63,16 +111,32 @@ class CallbackHandlerDDGConsole(BaseCallbackHandler):
     def on_llm_start(
         self, serialized: dict[str, Any], prompts: list[str], **kwargs: Any
     ) -> None:
-        print(self.init_str, end="", flush=True)
+        stdout_writer.write(self.init_str)
 
     def on_llm_new_token(self, token, **kwargs) -> None:
-        print(token, end="", flush=True)
+        stdout_writer.write(token)
 
     def on_llm_end(self, *args, **kwargs) -> None:
-        print()
+        # Wait for the streamed answer to be written, so it isn't interleaved with
+        # whatever is printed next
+        stdout_writer.write("\n")
+        stdout_writer.wait()
+
+    def on_llm_error(self, *args, **kwargs) -> None:
+        stdout_writer.wait()
 
     def on_retry(self, *args, **kwargs) -> None:
-        print(f"ON_RETRY: \nargs = {args}\nkwargs = {kwargs}")
+        stdout_writer.write(f"ON_RETRY: \nargs = {args}\nkwargs = {kwargs}\n")
+
+
+def get_latency_model_kwargs(settings: BotSettings) -> dict[str, Any]:
+    """
+    Return the extra model kwargs that request the OpenAI API's priority processing
+    tier (lower latency, higher price), if settings.latency_optimized is True.
+    """
+    if not settings.latency_optimized:
+        return {}
+    return {"extra_body": {"service_tier": "priority"}}
 
 
 def get_llm_with_callbacks(
@@ -93,7 +157,9 @@ def get_llm_with_callbacks(
             callbacks=callbacks,
         )
     else:
+        client = get_openai_client(api_key or "", LLM_REQUEST_TIMEOUT)
         llm = ChatOpenAI(
+            client=client.chat.completions,  # uses the shared connection pool
             api_key=api_key or "",  # don't allow None, no implicit key from env
             model=settings.llm_model_name,
             temperature=settings.temperature,
@@ -101,6 +167,7 @@ def get_llm_with_callbacks(
             streaming=True,
             callbacks=callbacks,
             verbose=True,  # tmp
+            model_kwargs=get_latency_model_kwargs(settings),
         )
     return llm
 
@@ -153,6 +220,36 @@ def get_llm_from_prompt_llm_chain(prompt_llm_chain):
     return prompt_llm_chain.middle[0]
 
 
+def get_prompt_cache_key(prompt: PromptTemplate, context: str) -> str:
+    """
+    Return a short hash identifying a prompt prefix: the prompt template (whose text
+    precedes the context, and differs e.g. between /docs and /quotes) together with
+    the context filled into it (e.g. retrieved docs).
+    """
+    prompt_prefix = f"{prompt!r}\n{context}"
+    return hashlib.blake2b(prompt_prefix.encode(), digest_size=16).hexdigest()
+
+
+def with_prompt_cache_key(prompt_llm_chain, prompt_cache_key: str):
+    """
+    Return a version of a chain created by get_prompt_llm_chain whose LLM requests
+    include the given prompt_cache_key. This helps the OpenAI API route requests
+    that share a prompt prefix to the same prompt cache. Not used with Azure.
+    """
+    if IS_AZURE:
+        return prompt_llm_chain
+
+    steps = []
+    for step in prompt_llm_chain.steps:
+        if isinstance(step, ChatOpenAI):
+            # Keep any other extra_body params (e.g. service_tier) intact
+            extra_body = step.model_kwargs.get("extra_body", {})
+            extra_body = extra_body | {"prompt_cache_key": prompt_cache_key}
+            step = step.bind(extra_body=extra_body)
+        steps.append(step)
+    return reduce(operator.or_, steps)
+
+
 if __name__ == "__main__":
     # NOTE: Run this file as "python -m components.llm"
     x = CallbackHandlerDDGConsole("BOT: ")
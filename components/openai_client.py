@@ -0,0 +1,28 @@
+import httpx
+import openai
+
+# HTTP client shared by all OpenAI API clients, so that connections (and their
+# TCP/TLS handshakes) are reused across LLM and embeddings calls and across turns
+shared_http_client = httpx.Client(
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+)
+
+
+def get_openai_client(
+    api_key: str, timeout: float | None = None, max_retries: int = 2
+) -> openai.OpenAI:
+    """
+    Return an OpenAI API client that uses the shared HTTP connection pool. If
+    timeout is None, the shared HTTP client's timeout is used.
+
+    NOTE: only the synchronous client can share the pool; async clients (which
+    Langchain creates separately) keep their own.
+    """
+    timeout_kwarg = {} if timeout is None else {"timeout": timeout}
+    return openai.OpenAI(
+        api_key=api_key,
+        max_retries=max_retries,
+        http_client=shared_http_client,
+        **timeout_kwarg,
+    )
@@ -1,8 +1,11 @@
 import os
+from functools import lru_cache
+from threading import Event, Lock
 
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.schema.embeddings import Embeddings
 
+from components.openai_client import get_openai_client
 from utils.prepare import IS_AZURE
 
 
@@ -14,10 +17,113 @@ def get_openai_embeddings(api_key: str | None = None) -> Embeddings:
             deployment=os.getenv("EMBEDDINGS_DEPLOYMENT_NAME"), chunk_size=16
         )
         if IS_AZURE
-        else OpenAIEmbeddings(api_key=api_key or "")  # NOTE: if empty key, will throw
+        else OpenAIEmbeddings(  # NOTE: if empty key, will throw
+            client=get_openai_client(api_key or "").embeddings, api_key=api_key or ""
+        )
     )
 
 
+class _PendingQuery:
+    """A query waiting to be embedded as part of a batch."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.embedding: list[float] | None = None
+        self.error: Exception | None = None
+        self.is_leader = False  # whether this query's thread must embed a batch
+        self.done = Event()  # set when embedded or when made the leader
+
+
+class BatchingEmbedder(Embeddings):
+    """
+    Wrapper around an Embeddings object that coalesces queries submitted at about
+    the same time (e.g. from different threads of the Streamlit app) into a single
+    embeddings API call.
+
+    A query that arrives when no API call is in progress is embedded right away.
+    Queries that arrive while one is in progress are collected and then embedded
+    together (up to max_batch_size at a time) as soon as it finishes. Documents are
+    passed through to the wrapped object unchanged.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self._pending: list[_PendingQuery] = []
+        self._is_embedding = False
+        self._lock = Lock()
+
+    def _embed_next_batch(self) -> None:
+        """
+        Embed the next batch of pending queries in one API call, then make the
+        first of the remaining ones (if any) the leader for the next batch.
+        """
+        with self._lock:
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+
+        try:
+            texts = list(dict.fromkeys(query.text for query in batch))
+            embedding_by_text = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            for query in batch:
+                query.embedding = embedding_by_text[query.text]
+        except Exception as e:
+            for query in batch:
+                query.error = e
+        finally:
+            with self._lock:
+                if self._pending:
+                    next_leader = self._pending[0]
+                    next_leader.is_leader = True
+                else:
+                    next_leader = None
+                    self._is_embedding = False
+            for query in batch:
+                query.done.set()
+            if next_leader is not None:
+                next_leader.done.set()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed query text, batching it with any concurrently submitted queries."""
+        query = _PendingQuery(text)
+        with self._lock:
+            self._pending.append(query)
+            if not self._is_embedding:
+                query.is_leader = self._is_embedding = True
+
+        # Wait until the query is embedded as part of another thread's batch, or
+        # until it's this thread's turn to embed a batch (which will include it)
+        if not query.is_leader:
+            query.done.wait()
+        if query.is_leader:
+            self._embed_next_batch()
+
+        if query.error is not None:
+            raise query.error
+        return query.embedding
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed search docs."""
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Asynchronous Embed query text."""
+        return await self.embeddings.aembed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Asynchronous Embed search docs."""
+        return await self.embeddings.aembed_documents(texts)
+
+
+@lru_cache(maxsize=64)
+def get_batching_openai_embeddings(api_key: str | None = None) -> BatchingEmbedder:
+    """
+    Return a BatchingEmbedder shared by all callers using the same API key, so that
+    their concurrent queries can be batched together.
+    """
+    return BatchingEmbedder(get_openai_embeddings(api_key))
+
+
 # class OpenAIEmbeddingsDDG(Embeddings):
 #     """
 #     Custom version of OpenAIEmbeddings for DocDocGo. Unlike the original,
@@ -0,0 +1,103 @@
+from threading import Lock
+from typing import Any
+
+import numpy as np
+
+from utils.type_utils import Props
+
+
+class SemanticResponseCache:
+    """
+    LRU cache of bot responses, keyed by the embedding of the user's query.
+
+    A lookup returns the cached response to the most similar earlier query, provided
+    that its cosine similarity to the new query is at least similarity_threshold and
+    that it was obtained in the same context (chat mode, collection, etc.), as
+    identified by context_key.
+
+    The embeddings are stored as rows of a contiguous float32 matrix, so that a
+    lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, max_size: int = 256, similarity_threshold: float = 0.95):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self._embeddings: np.ndarray | None = None  # allocated on first insert
+        self._context_keys: list[str] = []
+        self._responses: list[Props] = []
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._clock = 0  # incremented on every lookup hit or insert
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: list[float], context_key: str) -> Props | None:
+        """
+        Return the cached response for the most similar earlier query in the same
+        context, or None if there is no sufficiently similar one.
+        """
+        with self._lock:
+            if not self._responses:
+                return None
+            query = self._normalize(embedding)
+            if len(query) != self._embeddings.shape[1]:
+                return None  # e.g. the embedding model has changed
+            similarities = self._embeddings[: len(self._responses)] @ query
+
+            best_idx, best_similarity = None, self.similarity_threshold
+            for idx in np.flatnonzero(similarities >= self.similarity_threshold):
+                if (
+                    similarities[idx] >= best_similarity
+                    and self._context_keys[idx] == context_key
+                ):
+                    best_idx, best_similarity = idx, similarities[idx]
+
+            if best_idx is None:
+                return None
+            self._clock += 1
+            self._last_used[best_idx] = self._clock
+            return self._responses[best_idx]
+
+    def insert(self, embedding: list[float], context_key: str, response: Props) -> None:
+        """
+        Add a response to the cache, evicting the least recently used one if full.
+        """
+        if self.max_size < 1:
+            return
+        with self._lock:
+            vector = self._normalize(embedding)
+            if self._embeddings is None:
+                self._embeddings = np.empty((self.max_size, len(vector)), np.float32)
+            elif len(vector) != self._embeddings.shape[1]:
+                return
+
+            if len(self._responses) < self.max_size:
+                idx = len(self._responses)
+                self._context_keys.append(context_key)
+                self._responses.append(response)
+            else:
+                idx = int(np.argmin(self._last_used))
+                self._context_keys[idx] = context_key
+                self._responses[idx] = response
+
+            self._embeddings[idx] = vector
+            self._clock += 1
+            self._last_used[idx] = self._clock
+
+
+def get_cacheable_part_of_response(response: dict[str, Any]) -> Props:
+    """
+    Extract the part of a bot response that is safe to reuse for a repeated query.
+    """
+    return {
+        k: response[k]
+        for k in ("answer", "source_documents", "generated_question")
+        if k in response
+    }
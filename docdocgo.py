@@ -1,18 +1,32 @@
+import asyncio
+import itertools
+import json
 import os
-from typing import Any
+from threading import Thread
+from typing import Any, AsyncIterator, Callable
 
 from langchain.chains import LLMChain
 from langchain.schema.language_model import BaseLanguageModel
 
 from _prepare_env import is_env_loaded
 from agents.dbmanager import handle_db_command
-from agents.researcher import get_researcher_response, get_websearcher_response
+from agents.researcher import (
+    aget_researcher_response,
+    get_researcher_response,
+    get_websearcher_response,
+)
 from components.chat_with_docs_chain import ChatWithDocsChain
 from components.chroma_ddg import ChromaDDG, load_vectorstore
 from components.chroma_ddg_retriever import ChromaDDGRetriever
 from components.llm import get_llm, get_llm_from_prompt_llm_chain, get_prompt_llm_chain
+from components.semantic_response_cache import (
+    SemanticResponseCache,
+    get_cacheable_part_of_response,
+)
 from utils.algo import remove_duplicates_keep_order
+from utils.async_utils import run_in_daemon_thread
 from utils.chat_state import ChatState
+from utils.docgrab import ingestion_counts
 from utils.helpers import (
     DEFAULT_MODE,
     DELIMITER,
@@ -21,11 +35,13 @@ from utils.helpers import (
     MAIN_BOT_PREFIX,
     print_no_newline,
 )
-from utils.lang_utils import pairwise_chat_history_to_msg_list
+from utils.lang_utils import pairwise_chat_history_to_msg_list, preload_tokenizer
 
 # Load environment variables
 from utils.prepare import (
     DEFAULT_COLLECTION_NAME,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
 )
 from utils.prompts import (
     CHAT_WITH_DOCS_PROMPT,
@@ -34,79 +50,200 @@ from utils.prompts import (
     QA_PROMPT_QUOTES,
     QA_PROMPT_SUMMARIZE_KB,
 )
-from utils.query_parsing import parse_query
-from utils.type_utils import ChatMode, OperationMode
+from utils.query_parsing import get_scheduled_query_instruction, parse_query
+from utils.type_utils import ChatMode, OperationMode, PairwiseChatHistory
+
+
+# Chat modes whose responses depend only on the query, collection and settings
+# (provided there is no chat history), and so can be reused for a similar query
+SEMANTICALLY_CACHEABLE_CHAT_MODES = {
+    ChatMode.CHAT_WITH_DOCS_COMMAND_ID,
+    ChatMode.DETAILS_COMMAND_ID,
+    ChatMode.QUOTES_COMMAND_ID,
+}
+
+semantic_response_cache = SemanticResponseCache(
+    max_size=SEMANTIC_CACHE_SIZE, similarity_threshold=SEMANTIC_CACHE_THRESHOLD
+)
+
+
+def get_semantic_cache_context_key(chat_state: ChatState) -> str:
+    """
+    Return a string identifying everything other than the query itself that
+    the response to a cacheable query depends on.
+
+    The collection's id and ingestion count are included, so that responses cached
+    before docs were ingested into the collection by this process (or before it was
+    deleted and recreated with the same name) are not reused.
+    """
+    collection_id = chat_state.vectorstore.collection.id
+    return json.dumps(
+        [
+            chat_state.chat_mode.value,
+            str(collection_id),
+            ingestion_counts[collection_id],
+            chat_state.search_params,
+            chat_state.bot_settings.model_dump(),
+        ],
+        sort_keys=True,
+    )
 
 
 def get_bot_response(chat_state: ChatState):
-    chat_mode = chat_state.chat_mode
-    if chat_mode == ChatMode.CHAT_WITH_DOCS_COMMAND_ID:  # /docs command
-        chat_chain = get_docs_chat_chain(chat_state)
-    elif chat_mode == ChatMode.DETAILS_COMMAND_ID:  # /details command
-        chat_chain = get_docs_chat_chain(chat_state, prompt_qa=QA_PROMPT_SUMMARIZE_KB)
-    elif chat_mode == ChatMode.QUOTES_COMMAND_ID:  # /quotes command
-        chat_chain = get_docs_chat_chain(chat_state, prompt_qa=QA_PROMPT_QUOTES)
-    elif chat_mode == ChatMode.WEB_COMMAND_ID:  # /web command
-        return get_websearcher_response(chat_state)
-    elif chat_mode == ChatMode.RESEARCH_COMMAND_ID:  # /research command
-        # Get response from iterative researcher
-        res_from_bot = get_researcher_response(chat_state)
-        rr_data = res_from_bot.get("rr_data")
-
-        # Load the new vectorstore if needed
-        partial_res = {}
-        if rr_data and rr_data.collection_name != chat_state.vectorstore.name:
-            vectorstore = chat_state.get_new_vectorstore(rr_data.collection_name)
-            partial_res["vectorstore"] = vectorstore
-
-        # Return response, including the new vectorstore if needed
-        return partial_res | res_from_bot
-    elif chat_mode == ChatMode.JUST_CHAT_COMMAND_ID:  # /chat command
-        chat_chain = get_prompt_llm_chain(
-            JUST_CHAT_PROMPT,
-            llm_settings=chat_state.bot_settings,
-            api_key=chat_state.openai_api_key,
-            callbacks=chat_state.callbacks,
-            stream=True,
-        )
-        answer = chat_chain.invoke(
-            {
-                "message": chat_state.message,
-                "chat_history": pairwise_chat_history_to_msg_list(
-                    chat_state.chat_history
-                ),
-            }
-        )
-        return {"answer": answer}
-    elif chat_mode == ChatMode.DB_COMMAND_ID:  # /db command
-        return handle_db_command(chat_state)
-    elif chat_mode == ChatMode.HELP_COMMAND_ID:  # /help command
-        return {"answer": HELP_MESSAGE}
-    elif chat_mode == ChatMode.INGEST_COMMAND_ID:  # /ingest command
-        if chat_state.operation_mode.value == OperationMode.STREAMLIT.value:
-            # NOTE: "value" is needed because OperationMode, ChromaDDG, etc. sometimes
-            # get imported twice (I think when Streamlit reloads the code).
-            return {"answer": "Please select your documents to upload and ingest."}
-        elif chat_state.operation_mode.value == OperationMode.CONSOLE.value:
-            return {
-                "answer": "Sorry, the /ingest command is only supported in Streamlit mode. "
-                + "In console mode, please run `python ingest_local_docs.py`."
-            }
-        else:
-            return {"answer": "Sorry, this is only supported in Streamlit mode."}
-    else:
-        # Should never happen
-        raise ValueError(f"Invalid command id: {chat_mode}")
+    # Only standalone queries (no chat history) in certain modes can be cached
+    if (
+        not SEMANTIC_CACHE_SIZE
+        or not chat_state.message
+        or chat_state.chat_history
+        or chat_state.vectorstore is None
+        or chat_state.chat_mode not in SEMANTICALLY_CACHEABLE_CHAT_MODES
+    ):
+        return get_uncached_bot_response(chat_state)
+
+    # Return the response to an earlier near-duplicate query, if there is one
+    context_key = get_semantic_cache_context_key(chat_state)
+    query_embedding = chat_state.vectorstore.embeddings.embed_query(
+        chat_state.message
+    )
+    if cached_response := semantic_response_cache.lookup(query_embedding, context_key):
+        return cached_response | {"needs_print": True}  # it won't be streamed
 
+    # Otherwise, get the response (reusing the embedding for retrieval) and cache it
+    chat_state.update(query_embedding=query_embedding)
+    try:
+        response = get_uncached_bot_response(chat_state)
+    finally:
+        chat_state.update(query_embedding=None)  # chat_state may be reused (Streamlit)
+    semantic_response_cache.insert(
+        query_embedding, context_key, get_cacheable_part_of_response(response)
+    )
+    return response
+
+
+def invoke_docs_chat_chain(chat_state: ChatState, prompt_qa) -> dict[str, Any]:
+    chat_chain = get_docs_chat_chain(chat_state, prompt_qa=prompt_qa)
     return chat_chain.invoke(
         {
             "question": chat_state.message,
             "chat_history": chat_state.chat_history,
             "search_params": chat_state.search_params,
+            "query_embedding": chat_state.query_embedding,
         }
     )
 
 
+def handle_docs_command(chat_state: ChatState):  # /docs command
+    return invoke_docs_chat_chain(chat_state, CHAT_WITH_DOCS_PROMPT)
+
+
+def handle_details_command(chat_state: ChatState):  # /details command
+    return invoke_docs_chat_chain(chat_state, QA_PROMPT_SUMMARIZE_KB)
+
+
+def handle_quotes_command(chat_state: ChatState):  # /quotes command
+    return invoke_docs_chat_chain(chat_state, QA_PROMPT_QUOTES)
+
+
+def handle_research_command(chat_state: ChatState):  # /research command
+    # Get response from iterative researcher
+    res_from_bot = get_researcher_response(chat_state)
+    return add_new_vectorstore_if_needed(chat_state, res_from_bot)
+
+
+def handle_just_chat_command(chat_state: ChatState):  # /chat command
+    chat_chain = get_prompt_llm_chain(
+        JUST_CHAT_PROMPT,
+        llm_settings=chat_state.bot_settings,
+        api_key=chat_state.openai_api_key,
+        callbacks=chat_state.callbacks,
+        stream=True,
+    )
+    answer = chat_chain.invoke(
+        {
+            "message": chat_state.message,
+            "chat_history": pairwise_chat_history_to_msg_list(chat_state.chat_history),
+        }
+    )
+    return {"answer": answer}
+
+
+def handle_help_command(chat_state: ChatState):  # /help command
+    return {"answer": HELP_MESSAGE}
+
+
+def handle_ingest_command(chat_state: ChatState):  # /ingest command
+    if chat_state.operation_mode.value == OperationMode.STREAMLIT.value:
+        # NOTE: "value" is needed because OperationMode, ChromaDDG, etc. sometimes
+        # get imported twice (I think when Streamlit reloads the code).
+        return {"answer": "Please select your documents to upload and ingest."}
+    elif chat_state.operation_mode.value == OperationMode.CONSOLE.value:
+        return {
+            "answer": "Sorry, the /ingest command is only supported in Streamlit mode. "
+            + "In console mode, please run `python ingest_local_docs.py`."
+        }
+    else:
+        return {"answer": "Sorry, this is only supported in Streamlit mode."}
+
+
+command_handlers: dict[ChatMode, Callable[[ChatState], dict[str, Any]]] = {
+    ChatMode.CHAT_WITH_DOCS_COMMAND_ID: handle_docs_command,
+    ChatMode.DETAILS_COMMAND_ID: handle_details_command,
+    ChatMode.QUOTES_COMMAND_ID: handle_quotes_command,
+    ChatMode.WEB_COMMAND_ID: get_websearcher_response,
+    ChatMode.RESEARCH_COMMAND_ID: handle_research_command,
+    ChatMode.JUST_CHAT_COMMAND_ID: handle_just_chat_command,
+    ChatMode.DB_COMMAND_ID: handle_db_command,
+    ChatMode.HELP_COMMAND_ID: handle_help_command,
+    ChatMode.INGEST_COMMAND_ID: handle_ingest_command,
+}
+
+
+def get_uncached_bot_response(chat_state: ChatState):
+    try:
+        handler = command_handlers[chat_state.chat_mode]
+    except KeyError:
+        # Should never happen
+        raise ValueError(f"Invalid command id: {chat_state.chat_mode}")
+    return handler(chat_state)
+
+
+def add_new_vectorstore_if_needed(chat_state: ChatState, res_from_bot: dict):
+    """
+    Return the researcher's response, including the new vectorstore if the research
+    was saved to a different collection than the current one.
+    """
+    rr_data = res_from_bot.get("rr_data")
+
+    # Load the new vectorstore if needed
+    partial_res = {}
+    if rr_data and rr_data.collection_name != chat_state.vectorstore.name:
+        vectorstore = chat_state.get_new_vectorstore(rr_data.collection_name)
+        partial_res["vectorstore"] = vectorstore
+
+    # Return response, including the new vectorstore if needed
+    return partial_res | res_from_bot
+
+
+async def aget_bot_responses(chat_state: ChatState) -> AsyncIterator[dict[str, Any]]:
+    """
+    Async version of get_bot_response that yields responses as soon as they're
+    ready. For most commands, there is just one response, obtained in a worker
+    thread. For the /research command, there is one response per research
+    iteration (e.g. 5 for "/research auto 5").
+    """
+    if chat_state.chat_mode != ChatMode.RESEARCH_COMMAND_ID:
+        yield await run_in_daemon_thread(get_bot_response, chat_state)
+        return
+
+    async for res_from_bot in aget_researcher_response(chat_state):
+        response = add_new_vectorstore_if_needed(chat_state, res_from_bot)
+
+        # Next iteration (if any) must use the collection the research is saved in
+        if "vectorstore" in response:
+            chat_state.vectorstore = response["vectorstore"]
+        yield response
+
+
 def get_source_links(result_from_chain: dict[str, Any]) -> list[str]:
     """
     Return a list of source links from the result of a chat chain.
@@ -114,23 +251,64 @@ def get_source_links(result_from_chain: dict[str, Any]) -> list[str]:
 
     source_docs = result_from_chain.get("source_documents", [])
 
-    sources_with_duplicates = [
-        doc.metadata["source"] for doc in source_docs if "source" in doc.metadata
-    ]
+    sources_with_duplicates = itertools.chain(
+        filter(None, (doc.metadata.get("source") for doc in source_docs)),
+        result_from_chain.get("source_links", []),
+    )
+
+    # Remove duplicates while keeping order and return (in one pass)
+    return remove_duplicates_keep_order(sources_with_duplicates)
 
-    sources_with_duplicates += result_from_chain.get("source_links", [])
 
-    # For performance
-    if not sources_with_duplicates:
-        return sources_with_duplicates  # return empty list
+# Debugging flags (environment variables don't change at runtime)
+PRINT_CONDENSE_QUESTION_PROMPT = bool(os.getenv("PRINT_CONDENSE_QUESTION_PROMPT"))
+PRINT_SIMILARITIES = bool(os.getenv("PRINT_SIMILARITIES"))
+PRINT_QA_PROMPT = bool(os.getenv("PRINT_QA_PROMPT"))
 
-    # Remove duplicates while keeping order and return
-    return remove_duplicates_keep_order(sources_with_duplicates)
+# Chains for chatting with docs, reused across turns with the same settings
+MAX_CACHED_DOCS_CHAT_CHAINS = 64
+docs_chat_chain_cache: dict[tuple, ChatWithDocsChain] = {}
 
 
 def get_docs_chat_chain(
     chat_state: ChatState,
     prompt_qa=CHAT_WITH_DOCS_PROMPT,
+):
+    """
+    Return a chain to respond to queries using a vectorstore of documents.
+
+    The chain is reused if one was already created with the same prompt, settings,
+    vectorstore and API key. Chains with custom callbacks (e.g. Streamlit's, which
+    are different for every run) are always created anew.
+    """
+    if chat_state.callbacks is not None:
+        return create_docs_chat_chain(chat_state, prompt_qa)
+
+    # NOTE: the cached chain references the prompt and vectorstore, so their ids
+    # can't be reused by other objects while it's in the cache
+    cache_key = (
+        id(prompt_qa),
+        id(chat_state.vectorstore),
+        chat_state.bot_settings.model_dump_json(),
+        chat_state.openai_api_key,
+    )
+    try:
+        return docs_chat_chain_cache[cache_key]
+    except KeyError:
+        pass
+
+    # Evict the oldest chain if needed, then create and cache the new one
+    if len(docs_chat_chain_cache) >= MAX_CACHED_DOCS_CHAT_CHAINS:
+        del docs_chat_chain_cache[next(iter(docs_chat_chain_cache))]
+    chain = docs_chat_chain_cache[cache_key] = create_docs_chat_chain(
+        chat_state, prompt_qa
+    )
+    return chain
+
+
+def create_docs_chat_chain(
+    chat_state: ChatState,
+    prompt_qa=CHAT_WITH_DOCS_PROMPT,
 ):
     """
     Create a chain to respond to queries using a vectorstore of documents.
@@ -143,7 +321,7 @@ def get_docs_chat_chain(
     query_generator_chain = LLMChain(
         llm=llm_for_q_generation,
         prompt=CONDENSE_QUESTION_PROMPT,
-        verbose=bool(os.getenv("PRINT_CONDENSE_QUESTION_PROMPT")),
+        verbose=PRINT_CONDENSE_QUESTION_PROMPT,
     )  # need it to be an object that exposes easy access to the underlying llm
 
     # Initialize retriever from the provided vectorstore
@@ -159,7 +337,7 @@ def get_docs_chat_chain(
         vectorstore=chat_state.vectorstore,
         search_type="similarity_ddg",
         llm_for_token_counting=None,  # will be assigned in a moment
-        verbose=bool(os.getenv("PRINT_SIMILARITIES")),
+        verbose=PRINT_SIMILARITIES,
     )
     # retriever = VectorStoreRetriever(vectorstore=chat_state.vectorstore)
     # search_kwargs={
@@ -173,7 +351,7 @@ def get_docs_chat_chain(
         llm_settings=chat_state.bot_settings,
         api_key=chat_state.openai_api_key,
         callbacks=chat_state.callbacks,
-        print_prompt=bool(os.getenv("PRINT_QA_PROMPT")),
+        print_prompt=PRINT_QA_PROMPT,
         stream=True,
     )
 
@@ -214,13 +392,80 @@ def do_intro_tasks(openai_api_key: str):
             f"Could not load the default document collection {DEFAULT_COLLECTION_NAME}."
         )
     print("Done!")
+
+    # Avoid a delay on the first query that needs token counting (e.g. /docs)
+    try:
+        preload_tokenizer()
+    except Exception as e:
+        print(f"WARNING: could not preload the tokenizer. Error: {e}")
     return vectorstore
 
 
+def warm_up_embeddings(vectorstore: ChromaDDG) -> None:
+    """
+    Make a throwaway embeddings request, so that the connection to the embeddings
+    API is already established by the time the user's first query needs it.
+    """
+    try:
+        vectorstore.embeddings.embed_query("warm-up")
+    except Exception:
+        pass  # any real problem will surface when the user's query is processed
+
+
+def print_console_response(response: dict[str, Any]) -> None:
+    """
+    Print a bot response in the console (unless it was streamed) and its sources.
+    """
+    # Print reply if it wasn't streamed
+    if response.get("needs_print", False):
+        print(MAIN_BOT_PREFIX + response["answer"])
+    print("\n" + DELIMITER)
+
+    # Get sources
+    # TODO: also get sources from the researcher
+    source_links = get_source_links(response)
+    if source_links:
+        print("Sources:")
+        print(*source_links, sep="\n")
+        print(DELIMITER)
+
+    # Print standalone query if needed
+    if os.getenv("PRINT_STANDALONE_QUERY") and "generated_question" in response:
+        print(f"Standalone query: {response['generated_question']}")
+        print(DELIMITER)
+
+
+async def aprint_bot_responses(
+    chat_state: ChatState, chat_history: PairwiseChatHistory
+) -> None:
+    """
+    Print the bot's response(s) to the user's query as soon as they're ready,
+    adding them to chat_history and switching chat_state.vectorstore if needed.
+    """
+    message = chat_state.message
+    async for response in aget_bot_responses(chat_state):
+        print_console_response(response)
+
+        # Update chat history if needed
+        if answer := response["answer"]:
+            chat_history.append((message, answer))
+
+        # Update vectorstore if needed
+        if "vectorstore" in response:
+            chat_state.vectorstore = response["vectorstore"]
+
+        # Any further research iterations are recorded as in Streamlit
+        if new_parsed_query := response.get("new_parsed_query"):
+            message = get_scheduled_query_instruction(new_parsed_query)
+
+
 if __name__ == "__main__":
     vectorstore = do_intro_tasks(os.getenv("DEFAULT_OPENAI_API_KEY", ""))
     TWO_BOTS = False  # os.getenv("TWO_BOTS", False) # disabled for now
 
+    # Warm up the connection while the user is typing their first query
+    Thread(target=warm_up_embeddings, args=(vectorstore,), daemon=True).start()
+
     # Start chat
     chat_history = []
     while True:
@@ -232,7 +477,7 @@ if __name__ == "__main__":
         )
         print(DELIMITER)
 
-        # Get query from user
+        # Get query from user (in the main thread, so that Ctrl+C exits right away)
         query = input("\nYOU: ")
         if query.strip() in {"exit", "/exit", "quit", "/quit"}:
             break
@@ -246,52 +491,28 @@ if __name__ == "__main__":
         # Parse the query to extract command id & search params, if any
         parsed_query = parse_query(query)
 
-        # Get response from the bot
+        # Get response(s) from the bot, handling each as soon as it's ready. The
+        # responses are obtained in daemon threads, so Ctrl+C exits right away too
+        chat_state = ChatState(
+            operation_mode=OperationMode.CONSOLE,
+            parsed_query=parsed_query,
+            chat_history=chat_history,
+            chat_and_command_history=chat_history,  # not used in console mode
+            vectorstore=vectorstore,  # callbacks and bot_settings can be default here
+            openai_api_key=os.getenv("DEFAULT_OPENAI_API_KEY", ""),
+        )
         try:
-            response = get_bot_response(
-                ChatState(
-                    operation_mode=OperationMode.CONSOLE,
-                    parsed_query=parsed_query,
-                    chat_history=chat_history,
-                    chat_and_command_history=chat_history,  # not used in console mode
-                    vectorstore=vectorstore,  # callbacks and bot_settings can be default here
-                    openai_api_key=os.getenv("DEFAULT_OPENAI_API_KEY", ""),
-                )
-            )
+            asyncio.run(aprint_bot_responses(chat_state, chat_history))
         except Exception as e:
             print("<Apologies, an error has occurred>")
             print("ERROR:", e)
             print(DELIMITER)
             if os.getenv("RERAISE_EXCEPTIONS"):
                 raise e
-            continue
-        answer = response["answer"]
 
-        # Print reply if it wasn't streamed
-        if response.get("needs_print", False):
-            print(MAIN_BOT_PREFIX + answer)
-        print("\n" + DELIMITER)
+        # Switch to the new vectorstore if needed (even if a later step failed)
+        vectorstore = chat_state.vectorstore
 
-        # Update chat history if needed
-        if answer:
-            chat_history.append((parsed_query.message, answer))
-
-        # Update vectorstore if needed
-        if "vectorstore" in response:
-            vectorstore = response["vectorstore"]
-
-        # Get sources
-        # TODO: also get sources from the researcher
-        source_links = get_source_links(response)
-        if source_links:
-            print("Sources:")
-            print(*source_links, sep="\n")
-            print(DELIMITER)
-
-        # Print standalone query if needed
-        if os.getenv("PRINT_STANDALONE_QUERY") and "generated_question" in response:
-            print(f"Standalone query: {response['generated_question']}")
-            print(DELIMITER)
 
 # This snippet is merely to make sure that Ruff or other tools don't remove the
 # _prepare_env import above, which is needed to set up the environment variables
@@ -17,7 +17,7 @@ from utils.helpers import (
 )
 from utils.output import format_exception
 from utils.prepare import DEFAULT_COLLECTION_NAME, TEMPERATURE
-from utils.query_parsing import parse_query
+from utils.query_parsing import get_scheduled_query_instruction, parse_query
 from utils.streamlit.helpers import (
     STAND_BY_FOR_INGESTION_MESSAGE,
     fix_markdown,
@@ -254,12 +254,7 @@ else:
     parsed_query = chat_state.scheduled_queries.pop()
     if not parsed_query:
         st.stop()  # nothing to do
-    full_query = "AUTO-INSTRUCTION: Run scheduled query."
-    try:
-        num_iterations_left = parsed_query.research_params.num_iterations_left
-        full_query += f" {num_iterations_left} research iterations left."
-    except AttributeError:
-        pass
+    full_query = get_scheduled_query_instruction(parsed_query)
 
 #### The rest will only run once there is a parsed query to run ####
 chat_mode = parsed_query.chat_mode
@@ -1,5 +1,6 @@
 import asyncio
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Thread
 
 # TODO: consider using async_to_sync from asgiref.sync library
 
@@ -52,6 +53,59 @@ def gather_tasks_sync(tasks):
     return run_task_sync(coroutine_from_tasks())
 
 
+async def gather_with_concurrency(max_concurrent: int, coros):
+    """
+    Await a list of coroutine objects concurrently, with at most max_concurrent of
+    them in progress at any given time (e.g. to respect API rate limits). Results
+    are returned in the same order as the coroutines.
+
+    The coroutines must not have been started yet (e.g. wrapped in asyncio tasks),
+    since they are only scheduled once they acquire the semaphore.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def run_with_semaphore(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run_with_semaphore(coro) for coro in coros))
+
+
+async def run_in_daemon_thread(func, *args, **kwargs):
+    """
+    Run a blocking function in a new daemon thread and await its result.
+
+    Unlike asyncio.to_thread, this doesn't use the loop's default executor, whose
+    shutdown (e.g. by asyncio.run after Ctrl+C) would wait for the function to
+    return, which for input() or a long LLM call can take indefinitely long. If the
+    awaiting task is cancelled, the function keeps running, but won't keep the
+    process alive.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result_if_pending(result=None, exception=None):
+        if future.done():
+            return  # e.g. the awaiting task was cancelled
+        if exception is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exception)
+
+    def run():
+        try:
+            result, exception = func(*args, **kwargs), None
+        except BaseException as e:
+            result, exception = None, e
+        try:
+            loop.call_soon_threadsafe(set_result_if_pending, result, exception)
+        except RuntimeError:
+            pass  # the loop is closed, so no one is waiting for the result
+
+    Thread(target=run, daemon=True).start()
+    return await future
+
+
 def execute_func_map_in_processes(func, inputs, max_workers=None):
     """
     Execute a function on a list of inputs in a separate process for each input.
@@ -48,6 +48,7 @@ class ChatState:
         user_id: str | None = None,
         openai_api_key: str | None = None,
         scheduled_queries: ScheduledQueries | None = None,
+        query_embedding: list[float] | None = None,
     ) -> None:
         self.operation_mode = operation_mode
         self.is_community_key = is_community_key
@@ -61,6 +62,7 @@ class ChatState:
         self.user_id = user_id
         self.openai_api_key = openai_api_key
         self.scheduled_queries = scheduled_queries or ScheduledQueries()
+        self.query_embedding = query_embedding  # of the message, if already computed
 
     @property
     def chat_mode(self) -> ChatMode:
@@ -1,6 +1,7 @@
 import json
 import os
 import uuid
+from collections import Counter
 from typing import Iterable
 
 from chromadb import ClientAPI
@@ -78,6 +79,10 @@ def prepare_chunks(
 
 FAKE_FULL_DOC_EMBEDDING = [1.0] * int(os.getenv("EMBEDDINGS_DIMENSIONS", 1536))
 
+# Number of times this process has ingested docs into each collection (by id), so that
+# responses cached before an ingestion can be told apart from those after it
+ingestion_counts: Counter[uuid.UUID] = Counter()
+
 
 def ingest_docs_into_chroma(
     docs: list[Document],
@@ -120,6 +125,7 @@ def ingest_docs_into_chroma(
     # Add the original full docs (with fake embeddings)
     fake_embeddings = [FAKE_FULL_DOC_EMBEDDING for _ in range(len(docs))]
     vectorstore.collection.add(full_doc_ids, fake_embeddings, metadatas, texts)
+    ingestion_counts[vectorstore.collection.id] += 1
 
     clg.log(f"Ingested documents into collection {collection_name}")
     if save_dir:
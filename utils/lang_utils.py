@@ -25,6 +25,14 @@ def get_token_ids(text: str, llm_for_token_counting: BaseLanguageModel | None =
     return tiktoken_encoding.encode_ordinary(text)  # LC uses encode instead
 
 
+def preload_tokenizer(llm_for_token_counting: BaseLanguageModel | None = None):
+    """
+    Load the tokenizer used for token counting (tiktoken may even need to download
+    it), so that the first query doesn't have to wait for it.
+    """
+    get_token_ids("", llm_for_token_counting)
+
+
 def get_num_tokens(text: str, llm_for_token_counting: BaseLanguageModel | None = None):
     """Get the number of tokens in a text."""
     return len(get_token_ids(text, llm_for_token_counting))
@@ -38,8 +38,15 @@ TEMPERATURE = float(os.getenv("TEMPERATURE", 0.3))
 
 LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 9))
 
+# Whether to request the provider's latency-optimized (priority) processing tier
+LATENCY_OPTIMIZED = bool(os.getenv("LATENCY_OPTIMIZED"))
+
 DEFAULT_MODE = os.getenv("DEFAULT_MODE", "/docs")
 
+# Cache of responses to standalone queries (size of 0 disables it)
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 256))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+
 # Check that the necessary environment variables are set
 DUMMY_OPENAI_API_KEY_PLACEHOLDER = "DUMMY NON-EMPTY VALUE"
 
@@ -30,6 +30,9 @@ research_commands_to_enum = {
 }
 research_view_subcommands = {"main", "base", "combined", "stats"}
 
+# Matches substrings in double quotes (captures the substring without the quotes)
+QUOTED_SUBSTRING_REGEX = re.compile(r'"([^"]*)"')
+
 
 class ResearchParams(BaseModel):
     task_type: ResearchCommand
@@ -168,7 +171,7 @@ def extract_search_params(query: str, mode="normal") -> tuple[str, Props]:
 
     # We are in "normal" mode with no JSON object at the end
     # Find all substrings in quotes and treat them as must-have substrings
-    substrings_in_quotes = re.findall(r'"([^"]*)"', query)
+    substrings_in_quotes = QUOTED_SUBSTRING_REGEX.findall(query)
     # substrings_in_quotes = re.findall(r'"(.*?)"', query) # another way (no '\n')
 
     # Remove empty strings and duplicates, form a list of $contains filters
@@ -241,3 +244,18 @@ def parse_query(
         return ParsedQuery(chat_mode=chat_mode, research_params=r, message=m)
 
     return ParsedQuery(chat_mode=chat_mode, message=query)
+
+
+def get_scheduled_query_instruction(parsed_query: ParsedQuery) -> str:
+    """
+    Return the text to show and record in the chat history in place of the user's
+    message for a query that was scheduled to run automatically (e.g. the next
+    iteration of "/research auto 5").
+    """
+    instruction = "AUTO-INSTRUCTION: Run scheduled query."
+    try:
+        num_iterations_left = parsed_query.research_params.num_iterations_left
+        instruction += f" {num_iterations_left} research iterations left."
+    except AttributeError:
+        pass
+    return instruction
@@ -4,7 +4,7 @@ from typing import Any
 from langchain.callbacks.base import BaseCallbackHandler
 from pydantic import BaseModel
 
-from utils.prepare import MODEL_NAME, TEMPERATURE
+from utils.prepare import LATENCY_OPTIMIZED, MODEL_NAME, TEMPERATURE
 
 JSONish = dict[str, Any] | list
 Props = dict[str, Any]
@@ -42,3 +42,4 @@ chat_modes_needing_llm = {
 class BotSettings(BaseModel):
     llm_model_name: str = MODEL_NAME
     temperature: float = TEMPERATURE
+    latency_optimized: bool = LATENCY_OPTIMIZED